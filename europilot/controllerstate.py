@@ -1,14 +1,23 @@
 import os
-import sys
 import json
-from subprocess import PIPE, Popen
+from array import array
 from threading import Thread
-from collections import OrderedDict
+
+from europilot import joystick
+
+# Index of each button name in the flat state array.
+_NAME_IDX = dict(
+    (name, idx) for idx, name in enumerate(joystick.BUTTON_NAMES)
+)
+
+_WHEEL_AXIS_IDX = _NAME_IDX['wheel-axis']
+_RESUME_BUTTON_IDX = _NAME_IDX['wheel-button-right-1']
+_PAUSE_BUTTON_IDX = _NAME_IDX['wheel-button-left-1']
 
 
 class ControllerOutput(object):
-    """Reads stdout from joystick.py, to get the controller event outputs without
-    blocking.
+    """Reads controller events from the `joystick` module in a background
+    thread, to get the controller outputs without blocking.
 
     """
     def __init__(self, state_listener=None):
@@ -19,38 +28,37 @@ class ControllerOutput(object):
         """
         self._controller_state = ControllerState()
         self._state_listener = state_listener
+        self._running = False
 
     def start(self):
-        ON_POSIX = 'posix' in sys.builtin_module_names
-        # use unbuffered output, since stdout will be generally small
-        # https://stackoverflow.com/questions/1410849/bypassing-buffering-of-subprocess-output-with-popen-in-c-or-python
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-
-        # XXX: This `python` may not be our desired python bin
-        self.p = Popen(
-            ['python', '-u', os.path.join(dir_path, 'joystick.py')],
-            bufsize=0,
-            stdout=PIPE,
-            close_fds=ON_POSIX
-        )
+        if os.path.exists(joystick.DEVICE_PATH):
+            stream = joystick.message_stream()
+        else:
+            # When joystick doesn't exist. Let's use dummy messages.
+            stream = joystick.dummy_message_stream()
+
+        self._running = True
         self.t = Thread(target=self.__update_state,
-                        args=(self.p,))
+                        args=(stream,))
         self.t.daemon = True  # thread dies with program
         self.t.start()
 
     def terminate(self):
-        self.p.terminate()
+        self._running = False
 
     def get_latest_state_obj(self):
-        return self._controller_state.get_state_obj()
-
-    def __update_state(self, process):
-        for line in iter(process.stdout.readline, ''):
-            self._controller_state.update_state(line.strip())
+        # Snapshot, not the live wrapper: callers hold on to this (and
+        # pickle it onto worker queues) while the reader thread keeps
+        # updating the live array.
+        return self._controller_state.get_state_snapshot()
+
+    def __update_state(self, stream):
+        for key, value in stream:
+            if not self._running:
+                break
+            self._controller_state.update_from_tuple(key, value)
             self._state_listener(self._controller_state.get_state_obj())
 
-        process.stdout.close()
-
 
 class ControllerState(object):
     """Thread-safe controller state.
@@ -58,90 +66,82 @@ class ControllerState(object):
         >>> c = ControllerState()
         >>> c.start()
         >>> c.get_state()
-        OrderedDict([('wheel-axis', '1012'), ('clutch', '-27865'),...]
+        {'wheel-axis': 1012, 'clutch': -27865, ...}
     """
     def __init__(self):
-        self.state = self.__init_dict()
-
-    def __init_dict(self):
-        """Initialize the values for each of the controller output"""
-        d = OrderedDict()
-        d['wheel-axis'] = '0'
-        d['clutch'] = '0'
-        d['brake'] = '0'
-        d['gas'] = '0'
-        d['paddle-left'] = '0'
-        d['paddle-right'] = '0'
-        d['wheel-button-left-1'] = '0'
-        d['wheel-button-left-2'] = '0'
-        d['wheel-button-left-3'] = '0'
-        d['wheel-button-right-1'] = '0'
-        d['wheel-button-right-2'] = '0'
-        d['wheel-button-right-3'] = '0'
-        d['shifter-button-left'] = '0'
-        d['shifter-button-right'] = '0'
-        d['shifter-button-up'] = '0'
-        d['shifter-button-down'] = '0'
-        d['dpad-left/right'] = '0'
-        d['dpad-up/down'] = '0'
-        d['shifter-button-1'] = '0'
-        d['shifter-button-2'] = '0'
-        d['shifter-button-3'] = '0'
-        d['shifter-button-4'] = '0'
-        d['gear-1'] = '0'
-        d['gear-2'] = '0'
-        d['gear-3'] = '0'
-        d['gear-4'] = '0'
-        d['gear-5'] = '0'
-        d['gear-6'] = '0'
-        d['gear-R'] = '0'
-
-        return d
-
-    def update_state(self, msg):
+        # The state lives in a flat int array laid out as
+        # `joystick.BUTTON_NAMES`: updating an entry is a C-level array
+        # store instead of a dict hash per event.
+        self.state = array('i', [0] * len(joystick.BUTTON_NAMES))
+        # `SensorData` just wraps the state array, so one instance
+        # created here always exposes the latest values. Constructing a
+        # fresh wrapper per event would only add allocations.
+        self._sensor_data = SensorData(self.state)
+        self._dirty = True
+        self._cached_json = None
+
+    def update_from_tuple(self, key, value):
         """Update ControllerState with the latest controller data"""
-        k, v = msg.split()
-        if k in self.state:
-            self.state[k] = v
+        idx = _NAME_IDX.get(key)
+        if idx is not None:
+            self.state[idx] = value
+            self._dirty = True
 
     def get_state(self):
-        """Returns the latest state"""
-        return self.state
+        """Returns the latest state as a dict keyed by button name"""
+        return dict(zip(joystick.BUTTON_NAMES, self.state))
 
     def get_state_obj(self):
         """Returns the latest `SensorData` object"""
-        return SensorData.from_ordered_dict(self.get_state())
+        return self._sensor_data
+
+    def get_state_snapshot(self):
+        """Returns a `SensorData` over a copy of the current values.
+
+        Unlike `get_state_obj`, the returned object is decoupled from
+        further updates, so it can cross thread or process boundaries
+        without observing values from two different events.
+
+        """
+        return SensorData(array('i', self.state))
 
     def get_state_json(self):
-        """Returns the latest state in json format"""
-        j = json.dumps(self.state)
-        return j
+        """Returns the latest state in json format.
+
+        The serialized snapshot is cached and only rebuilt after an
+        update, so polling faster than events arrive costs nothing.
+
+        """
+        if self._dirty:
+            self._cached_json = json.dumps(self.get_state())
+            self._dirty = False
+        return self._cached_json
 
 
 class SensorData(object):
+    __slots__ = ('_data',)
+
     def __init__(self, data):
         """Constructor.
-        :param data: `OrderedDict` containing sensor data.
+        :param data: array of sensor values laid out as
+        `joystick.BUTTON_NAMES`.
 
         """
         self._data = data
 
-    @staticmethod
-    def from_ordered_dict(dict_):
-        return SensorData(dict_)
-
     @property
     def raw(self):
-        return self._data
+        """Latest values as a dict keyed by button name"""
+        return dict(zip(joystick.BUTTON_NAMES, self._data))
 
     @property
     def wheel_axis(self):
-        return self._data['wheel-axis']
+        return self._data[_WHEEL_AXIS_IDX]
 
     @property
     def resume_button_pressed(self):
-        return self._data['wheel-button-right-1'] == '1'
+        return self._data[_RESUME_BUTTON_IDX] == 1
 
     @property
     def pause_button_pressed(self):
-        return self._data['wheel-button-left-1'] == '1'
+        return self._data[_PAUSE_BUTTON_IDX] == 1
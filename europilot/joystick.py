@@ -59,8 +59,10 @@ For Arrow Pad values, the output range is normalized to [-1, 1].
 import os
 import sys
 import time
+import struct
 import random
-from binascii import hexlify
+
+DEVICE_PATH = '/dev/input/js0'
 
 BUTTON_NAME = """
 0200=wheel-axis
@@ -95,99 +97,135 @@ BUTTON_NAME = """
 """
 
 
-class Bytewurst(object):
-
-    def __init__(self, bs):
-        self.raw = bs
-        self.ints = map(ord, bs)
+# Layout of a single event: sequence (uint32), value (int16),
+# group (uint8), axis (uint8), all little endian.
+# The value field is unpacked as a signed short so wheel values come out
+# already sign-extended to [-32767, 32767].
+_EVENT = struct.Struct('<IhBB')
 
-    def __repr__(self):
-        return ' '.join(map(hexlify, self.raw))
+# Button name keyed on (group << 8) | axis.
+_BUTTON_BY_ID = dict(
+    (int(hexkey, 16), name) for hexkey, name in
+    (line.split('=') for line in BUTTON_NAME.strip().split('\n'))
+)
 
-    @property
-    def int(self):
-        """
-        For "01 0A" ints would be [1, 10], so::
-            >>> bs = '\x01\x0A'
-            >>> bw = Bytewurst(bs)
-            >>> bw.int == (1 * 1) + (10 * 256)
-        """
+# Canonical button name order, shared with `controllerstate` so the
+# state layout has a single source of truth.
+BUTTON_NAMES = tuple(
+    line.split('=')[1] for line in BUTTON_NAME.strip().split('\n')
+)
 
-        def powergenerator(start=0):
-            """Generate powers of 256"""
-            i = start
-            while True:
-                yield 256 ** i
-                i += 1
 
-        return sum(a * b for a, b in zip(self.ints, powergenerator()))
+def _identity(value):
+    return value
 
-    @property
-    def hexLE(self):
-        return hexlify(self.raw)
 
-    @property
-    def bits(self):
-        return ' '.join([format(x, '08b') for x in self.ints])
+def _norm_pedal(value):
+    # Output range is normalized to [0, 65535]: no pressure 0x7fff maps
+    # to 0, full pressure 0x8001 maps to 65535. The bool accounts for
+    # the one-off asymmetry between the two halves of the raw range.
+    return 32767 - value + (value < 0)
 
 
-class Button(Bytewurst):
-    def __init__(self, bs):
-        super(Button, self).__init__(bs)
-        button_namedict = dict(line.split('=') for line in
-                               BUTTON_NAME.strip().split('\n'))
-        self.name = button_namedict.get(self.hexLE, 'UNKNOWN:%s' % self.hexLE)
+def _norm_dpad(value):
+    # Output range is normalized to [-1, 1].
+    if value == -32767:
+        return -1
+    elif value == 32767:
+        return 1
+    return value
 
 
-class Value(Bytewurst):
-    def __repr__(self):
-        if self.int == 0:
-            return ' off'
-        elif self.int == 1:
-            return ' on'
-        else:
-            return ' %d' % self.int
-
-    def int_normalized(self, name):
-        """ Normalizes value to an adequate range
-
-        For wheel values, the output range is normalized to [-32767, 32767].
-        For pedal values, the output range is normalized to [0, 65535].
-        For Arrow Pad values, the output range is normalized to [-1, 1].
-        """
-        v = super(Value, self).int
-        if name == 'wheel-axis':
-            if v >= 32769:
-                v = v - 65536
-        elif name == 'clutch' or name == 'brake' or name == 'gas':
-            if v >= 32769:
-                v = -v + 98304
-            else:
-                v = -v + 32767
-        elif name == 'dpad-left/right' or name == 'dpad-up/down':
-            if v == 32769:
-                v = -1
-            elif v == 32767:
-                v = 1
-
-        return v
+# Wheel-axis needs no entry: the signed unpack already yields the
+# normalized [-32767, 32767] range.
+_NORMALIZERS = {
+    'clutch': _norm_pedal,
+    'brake': _norm_pedal,
+    'gas': _norm_pedal,
+    'dpad-left/right': _norm_dpad,
+    'dpad-up/down': _norm_dpad,
+}
 
 
 class Message(object):
-    def __init__(self, bs):
-        self.bs = bs
-        self.raw_seq = bs[0:4]
-        self.raw_value = bs[4:6]
-        self.raw_id = bs[6:8]
-        self.ints = map(ord, bs)
-        self.sequence = Bytewurst(bs[0:4])
-        self.value = Value(bs[4:6])
-        self.button = Button(bs[6:8])
+    """Parsed 8-byte joystick event holding the button name and the
+    normalized value.
+
+    A single C-level `struct` unpack and two dict lookups replace the
+    byte-juggling wrapper objects which used to be allocated per event.
+
+    """
+    __slots__ = ('name', 'value')
+
+    def __init__(self, bs, offset=0):
+        _, value, group, axis = _EVENT.unpack_from(bs, offset)
+        button_id = (group << 8) | axis
+        name = _BUTTON_BY_ID.get(button_id)
+        if name is None:
+            name = 'UNKNOWN:%04x' % button_id
+        self.name = name
+        self.value = _NORMALIZERS.get(name, _identity)(value)
 
     def __repr__(self):
-        values = (self.button.name,
-                  self.value.int_normalized(self.button.name))
-        return ' '.join(map(str, values))
+        return '%s %d' % (self.name, self.value)
+
+
+def message_stream(device_path=DEVICE_PATH):
+    """Generator yielding `(name, value)` tuples parsed from the joystick
+    device.
+
+    Reading the device in process removes the subprocess pipe which used
+    to add a fork, a write/read syscall pair and a string parse per event.
+
+    Events are read in blocks of up to 64 to amortize the syscall cost.
+    `os.read` returns as soon as at least one event is available, so
+    batching adds no latency.
+
+    """
+    event_size = _EVENT.size
+    read_size = event_size * 64
+    fd = os.open(device_path, os.O_RDONLY)
+    try:
+        while True:
+            buf = os.read(fd, read_size)
+            for offset in range(0, len(buf), event_size):
+                message = Message(buf, offset)
+                yield (message.name, message.value)
+    finally:
+        os.close(fd)
+
+
+def dummy_message_stream():
+    """Generator yielding dummy `(name, value)` tuples when joystick
+    doesn't exist.
+
+    """
+    # Need to simulate straight wheel axis to test realtime fps adjustment.
+    straight = False
+    straight_start_time = None
+    straight_duration = 5
+    while True:
+        if not straight and random.randint(0, 99) == 0:
+            # Straight wheel axis for 5 secs.
+            straight = True
+            straight_start_time = time.time()
+
+        if straight and \
+                time.time() - straight_start_time > straight_duration:
+            # End of straight wheel axis
+            straight = False
+            straight_start_time = None
+
+        # Axis value 0 will be regarded as straight wheel regardless of
+        # `train.FpsAdjuster._max_straight_wheel_axis`.
+        wheel_axis = random.randint(-32767, 32767) if not straight else 0
+
+        # A real device delivers events at a bounded rate; without this
+        # the generator busy-loops and pegs a core now that it runs in
+        # process.
+        time.sleep(0.01)
+
+        yield ('wheel-axis', wheel_axis)
 
 
 class LinuxVirtualJoystick(object):
@@ -206,6 +244,10 @@ class LinuxVirtualJoystick(object):
     """
     def __init__(self, name='Virtual G27 Racing Wheel', bustype=0x0003,
                  vendor=0x046d, product=0xc29b, version=0x0111, events=None):
+        # Optional dependency: only needed when a virtual joystick is
+        # actually created, so capture-only installs work without it.
+        import uinput
+
         if events is None:
             events = (
                 # EV_KEY
@@ -249,19 +291,28 @@ class LinuxVirtualJoystick(object):
                                     product=product,
                                     version=version)
 
+        # Cache the axis constants so emit doesn't resolve module
+        # globals on every call.
+        self._abs_x = uinput.ABS_X
+        self._abs_y = uinput.ABS_Y
+        self._abs_z = uinput.ABS_Z
+        self._abs_rz = uinput.ABS_RZ
+
     def emit(self, angle, clutch=None, accel=None, brk=None):
         # emit as one atomic event, by using syn=True at the last emit call
         # for more information check the source code at
         # https://github.com/tuomasjjrasanen/python-uinput/blob/master/src/__init__.py#L191
 
-        if clutch:
-            self.device.emit(uinput.ABS_Y, clutch, syn=False)
-        if accel:
-            self.device.emit(uinput.ABS_Z, accel, syn=False)
-        if brk:
-            self.device.emit(uinput.ABS_RZ, brk, syn=False)
+        # NOTE `is not None` so that a legitimate 0 (fully released
+        # pedal) is still emitted.
+        if clutch is not None:
+            self.device.emit(self._abs_y, clutch, syn=False)
+        if accel is not None:
+            self.device.emit(self._abs_z, accel, syn=False)
+        if brk is not None:
+            self.device.emit(self._abs_rz, brk, syn=False)
 
-        self.device.emit(uinput.ABS_X, angle, syn=True)
+        self.device.emit(self._abs_x, angle, syn=True)
 
     def __del__(self):
         self.device.destroy()
@@ -269,48 +320,19 @@ class LinuxVirtualJoystick(object):
 
 # Handle platform dependent joystick impl
 if sys.platform.startswith('linux'):
-    import uinput
     VirtualJoystick = LinuxVirtualJoystick
 elif sys.platform == 'darwin':
     pass
 
 
 if __name__ == '__main__':
-    def _dump_messages(input_):
-        with open(input_, 'rb') as device:
-            while True:
-                bs = device.read(8)
-                message = Message(bs)
-                print(message)
-
-    def _dump_dummy_messages():
-        # Need to simulate straight wheel axis to test realtime fps adjustment.
-        straight = False
-        straight_start_time = None
-        straight_duration = 5
-        while True:
-            if not straight and random.randint(0, 99) == 0:
-                # Straight wheel axis for 5 secs.
-                straight = True
-                straight_start_time = time.time()
-
-            if straight and \
-                    time.time() - straight_start_time > straight_duration:
-                # End of straight wheel axis
-                straight = False
-                straight_start_time = None
-
-            # Axis value 0 will be regarded as straight wheel regardless of
-            # `train.FpsAdjuster._max_straight_wheel_axis`.
-            wheel_axis = random.randint(-32767, 32767) if not straight else 0
-
-            print('wheel-axis ' + str(wheel_axis))
-
     # TODO: Get device path as argument
-    device = '/dev/input/js0'
-    if os.path.exists(device):
-        _dump_messages(device)
+    if os.path.exists(DEVICE_PATH):
+        stream = message_stream()
     else:
         # When joystick doesn't exist. Let's dump dummy messages.
         # TODO: Warn this to stdout so that we can be aware of mock g27.
-        _dump_dummy_messages()
+        stream = dummy_message_stream()
+
+    for name, value in stream:
+        print('%s %s' % (name, value))
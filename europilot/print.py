@@ -1,20 +1,13 @@
-import threading
+import time
 
-from europilot.controllerstate import ControllerState
+from europilot.controllerstate import ControllerOutput
 
 if __name__ == '__main__':
-    c = ControllerState()
-    c.start()
-
-    def print_output():
-        threading.Timer(10.0, print_output).start()
-        print(c.get_state())
-
-    print_output()
-
-    # ON_POSIX = 'posix' in sys.builtin_module_names
-    # p = Popen(['python', '-u', 'g27.py'], bufsize=0, stdout=PIPE,
-    #                close_fds=ON_POSIX)
-    # for line in iter(p.stdout.readline, ''):
-    #     print("line: %s" % line)
-    # p.stdout.close()
+    controller_output = ControllerOutput(state_listener=lambda data: None)
+    controller_output.start()
+
+    # Single long-lived loop instead of a recursive `threading.Timer`,
+    # which spawned (and leaked) a fresh thread every 10 seconds.
+    while True:
+        print(controller_output.get_latest_state_obj().raw)
+        time.sleep(10)
@@ -7,13 +7,11 @@ local/remote machine.
 
 """
 
-import os
-import ast
 import time
-import traceback
+import threading
+import multiprocessing
 from sys import platform
 from itertools import count
-from subprocess import Popen, PIPE
 
 import numpy as np
 from mss import mss
@@ -22,6 +20,9 @@ from europilot.exceptions import ScreenException
 
 
 class Box(object):
+    __slots__ = ('_name', '_x1', '_y1', '_x2', '_y2', '_monitor',
+                 '_tuple', '_width', '_height')
+
     # Global counter which is used to name box
     _counter = count()
 
@@ -50,6 +51,11 @@ class Box(object):
         self._x2 = x2
         self._y2 = y2
         self._monitor = monitor
+        # Geometry is immutable, so precompute what the capture loop
+        # reads on every frame.
+        self._tuple = (x1, y1, x2, y2)
+        self._width = x2 - x1
+        self._height = y2 - y1
 
         if self._monitor is not None:
             # TODO: This is needed to support multiple monitors.
@@ -77,11 +83,11 @@ class Box(object):
 
     @property
     def width(self):
-        return self._x2 - self._x1
+        return self._width
 
     @property
     def height(self):
-        return self._y2 - self._y1
+        return self._height
 
     @property
     def channel(self):
@@ -90,10 +96,10 @@ class Box(object):
 
     @property
     def numpy_shape(self):
-        return (self.height, self.width, self.channel)
+        return (self._height, self._width, self.channel)
 
     def to_tuple(self):
-        return (self._x1, self._y1, self._x2, self._y2)
+        return self._tuple
 
 
 class Monitor(object):
@@ -163,7 +169,6 @@ class ScreenUtils(object):
         box = Box.from_monitor(monitors[0])
         local_grab = LocalScreenGrab(box)
         entire_screen = local_grab.grab()
-        entire_screen = entire_screen.reshape(box.numpy_shape)
 
         # 2. Select game window from entire screen.
         window_name = 'select_screen_area'
@@ -201,17 +206,30 @@ class _LocalImpl(object):
     def __init__(self, box):
         self._box = box
 
-    def read_screen(self):
+    def read_screen(self, out=None):
         """Reads RGB screen data and returns corresponding 1 dimensional
         numpy array so that it can be reshaped later.
 
+        :param out: Optional preallocated `numpy.ndarray` of
+        `box.numpy_shape` size. The frame is copied into it and `out` is
+        returned, so callers can reuse their own buffer across frames
+        instead of holding a reference into this impl's internal one.
+
         """
-        return self._post_process(
+        screen = self._post_process(
             self._read(self._box)
         )
+        if out is None:
+            return screen
+        # Reshaping a contiguous array is a view, so this is a single
+        # C-level copy into the caller's buffer.
+        np.copyto(out.reshape(-1), screen)
+        return out
 
     def _read(self, bounding_box):
-        """Reads screen and returns raw RGB `bytearray`.
+        """Reads screen and returns the RGB frame, either as a raw
+        `bytearray` or as an already-converted `numpy.ndarray`;
+        `_post_process` handles both.
 
         :param bounding_box: Read only given area of the screen.
 
@@ -219,9 +237,11 @@ class _LocalImpl(object):
         raise NotImplementedError()
 
     def _post_process(self, raw):
-        """Parses `bytearray` to `numpy.ndarray`
+        """Parses raw RGB data to 1 dimensional `numpy.ndarray`
 
         """
+        if isinstance(raw, np.ndarray):
+            return raw.ravel()
         single_byte_uint = '|u1'
         return np.frombuffer(raw, dtype=single_byte_uint)
 
@@ -231,6 +251,35 @@ class MssImpl(_LocalImpl):
         super(MssImpl, self).__init__(box)
         self._is_osx = platform == 'darwin'
         self._executor = mss()
+        # Output buffer reused across frames; the box size is fixed for
+        # the lifetime of this impl, so allocate once instead of per
+        # grab. NOTE that a returned frame is only valid until the next
+        # read overwrites it; callers needing to keep one must copy.
+        self._out = np.empty(box.numpy_shape, dtype=np.uint8)
+
+        # The grab region never changes either, so build the monitor
+        # dict (including the macOS width alignment) once instead of on
+        # every frame.
+        x1, y1, x2, y2 = box.to_tuple()
+        self._width = x2 - x1
+        grab_width = self._width
+        if self._is_osx and grab_width % 16 != 0:
+            # XXX: When the width is not divisible by 16, extra padding
+            # is added by macOS in the form of black pixels, which
+            # results in a screenshot with shifted pixels.
+            # To prevent this, `mss` reduces width to the closest
+            # smaller multiple of 16.
+            # But we don't want the width size to be reduced
+            # unexpectedly. This is a little hack to get the exact size
+            # of image. `_bgra_to_rgb` slices the extra columns back off
+            # in the same strided copy that does the channel conversion.
+            grab_width = grab_width + (16 - (grab_width % 16))
+        self._monitor_dict = {
+            'left': x1,
+            'top': y1,
+            'width': grab_width,
+            'height': y2 - y1
+        }
 
         if self._is_osx:
             # XXX: `mss` passes wrong param when it calls
@@ -252,44 +301,28 @@ class MssImpl(_LocalImpl):
         retina-like display which has a very high pixel density.
 
         """
-        # Coordinates need to be converted accordingly.
-        x1, y1, x2, y2 = bounding_box.to_tuple()
-        width = x2 - x1
-        height = y2 - y1
+        return self._bgra_to_rgb(
+            self._executor.grab(self._monitor_dict), self._width
+        )
 
-        monitor_dict = {
-            'left': x1,
-            'top': y1,
-            'width': width,
-            'height': height
-        }
+    def _bgra_to_rgb(self, shot, width=None):
+        """Converts a BGRA `mss.ScreenShot` into an RGB `numpy.ndarray`.
 
-        adjust_needed = self._is_osx and width % 16 != 0
-        if adjust_needed:
-            # XXX: When the width is not divisible by 16, extra padding is
-            # added by macOS in the form of black pixels, which results
-            # in a screenshot with shifted pixels.
-            # To prevent this, `mss` reduces width to the closest smaller
-            # multiple of 16.
-            # But we don't want the width size to be reduced unexpectedly.
-            # This is a little hack to get the exact size of image.
-            adjusted_width = width + (16 - (width % 16))
-            monitor_dict['width'] = adjusted_width
-
-            # Now `adjusted_rgb_data` has a bigger width.
-            # Let's cut the remaining width to get our desired width.
-            adjusted_rgb_data = self._executor.grab(monitor_dict).rgb
-            rgb_data = bytearray()
-            num_channels = 3
-            for idx in range(height):
-                offset = idx * (adjusted_width * num_channels)
-                rgb_data.extend(
-                    adjusted_rgb_data[offset:offset + width * num_channels]
-                )
+        One strided C-level copy into the reusable output buffer
+        replaces `ScreenShot.rgb`, which rebuilds the frame in Python
+        with six bytearray slice assignments plus a final bytes copy.
 
-            return rgb_data
-        else:
-            return self._executor.grab(monitor_dict).rgb
+        :param width: If given, keep only the leftmost `width` columns,
+        cropping any alignment padding columns in the grab.
+
+        """
+        bgra = np.frombuffer(
+            shot.raw, dtype=np.uint8
+        ).reshape(shot.height, shot.width, 4)
+        if width is None:
+            width = shot.width
+        self._out[:] = bgra[:, :width, 2::-1]
+        return self._out
 
 
 class PilImpl(_LocalImpl):
@@ -339,11 +372,131 @@ class ScreenGrab(object):
 class LocalScreenGrab(ScreenGrab):
     def __init__(self, box, impl=MssImpl):
         self._impl = impl(box)
+        self._shape = box.numpy_shape
 
-    def grab(self):
+    def grab(self, out=None):
+        """Returns the frame shaped `(height, width, 3)` so callers
+        don't have to reshape it themselves.
+
+        :param out: Optional preallocated output array of that shape.
+
+        """
+        frame = self._impl.read_screen(out)
+        if out is not None:
+            return frame
+        # Reshaping a contiguous array returns a view, not a copy.
+        return frame.reshape(self._shape)
+
+    def grab_flat(self):
+        """Returns the frame as a flat 1 dimensional array."""
         return self._impl.read_screen()
 
 
+class AsyncLocalScreenGrab(ScreenGrab):
+    """Captures the screen continuously in a background thread.
+
+    The producer thread writes frames into a small ring of preallocated
+    buffers and publishes the index of the newest complete one, so
+    `grab` never blocks on the OS capture call: it just returns the
+    latest published frame. Because slots are recycled, a returned
+    frame stays valid only until the producer wraps back around to its
+    slot; callers keeping a frame longer must copy it.
+
+    """
+    def __init__(self, box, impl=MssImpl, num_buffers=3):
+        self._box = box
+        self._impl = impl(box)
+        self._ring = [
+            np.empty(box.numpy_shape, dtype=np.uint8)
+            for _ in range(num_buffers)
+        ]
+        # Index of the newest complete frame, -1 until the first capture
+        # finishes. Published after the slot is fully written; reading
+        # and writing an int is atomic under the GIL so no lock is
+        # needed between producer and consumer.
+        self._published = -1
+        self._first_frame = threading.Event()
+        # Frame arrival signal for consumers that want every frame
+        # instead of the latest one; see `next_frame`.
+        self._frame_cond = threading.Condition()
+        self._frame_count = 0
+        self._last_consumed = 0
+        self._running = False
+        self._thread = None
+
+    def prepare(self):
+        self._running = True
+        self._thread = threading.Thread(target=self.__capture)
+        self._thread.daemon = True  # thread dies with program
+        self._thread.start()
+
+    def close(self):
+        self._running = False
+
+    @property
+    def ready(self):
+        return self._published >= 0
+
+    def grab(self):
+        """Returns the newest complete frame shaped
+        `(height, width, 3)`, matching `LocalScreenGrab.grab` and
+        `next_frame`.
+
+        Blocks only until the first frame has been captured.
+
+        """
+        self._first_frame.wait()
+        return self._ring[self._published]
+
+    def next_frame(self, timeout=None):
+        """Blocks until a frame newer than the one this method returned
+        last arrives, then returns it.
+
+        Unlike `grab`, which returns the newest frame immediately, this
+        never hands the same frame out twice, so a consumer loop runs
+        exactly once per capture with no polling or sleeps.
+
+        :param timeout: Seconds to wait before raising `ScreenException`.
+
+        """
+        # Manual wait loop instead of `Condition.wait_for` (py3.2+) so
+        # py2 keeps working.
+        deadline = None if timeout is None else time.time() + timeout
+        with self._frame_cond:
+            while self._frame_count <= self._last_consumed:
+                if deadline is None:
+                    self._frame_cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise ScreenException('Timed out waiting for frame')
+                    self._frame_cond.wait(remaining)
+            self._last_consumed = self._frame_count
+        return self._ring[self._published]
+
+    def __capture(self):
+        num_buffers = len(self._ring)
+        head = 0
+        while self._running:
+            # Capture straight into the ring slot via `out=` instead of
+            # copying the impl's internal buffer by hand.
+            self._impl.read_screen(out=self._ring[head])
+            self._published = head
+            self._first_frame.set()
+            with self._frame_cond:
+                self._frame_count += 1
+                self._frame_cond.notify_all()
+            head = (head + 1) % num_buffers
+
+
+def _select_screen_area(conn):
+    """Child-process entry point sending the selected box tuple back
+    through `conn`.
+
+    """
+    conn.send(ScreenUtils.select_screen_area().to_tuple())
+
+
 def stream_local_game_screen(box=None, default_fps=10):
     """Convenient wrapper for local screen capture.
     This method wraps everything which is needed to get game screen data in
@@ -357,37 +510,46 @@ def stream_local_game_screen(box=None, default_fps=10):
     :param default_fps: Target fps for screen capture. NOTE that this value
     can be adjusted from other coroutine.
 
+    NOTE that frames are written into two preallocated buffers used
+    alternately, so a yielded frame is overwritten two iterations later.
+    Consumers keeping a frame longer than one iteration must copy it.
+
     """
     if box is None:
-        # Open a new process and get output from stdout
         # Due to bug in cv2.selectROI, area selection window sometime hangs
         # until main process exits preventing us from capturing right screen
-        # data. We have to start subprocess to make sure the window to be
-        # closed before we start capturing the screen.
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        subproc = Popen([
-            'python', os.path.join(
-                dir_path, '..', 'scripts/select_screen_area.py')
-        ], stdout=PIPE)
-        output, _ = subproc.communicate()
-
+        # data. We have to run the selection in a child process to make
+        # sure the window is closed before we start capturing the
+        # screen. The box travels back through a `Pipe` instead of the
+        # stdout text parse of a freshly forked interpreter script.
+        parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        proc = multiprocessing.Process(
+            target=_select_screen_area, args=(child_conn,))
+        proc.start()
         try:
-            box_tuple = ast.literal_eval(output.split('\n')[-2])
-        except ValueError:
-            # Something went wrong.
-            traceback.print_exc()
+            box_tuple = parent_conn.recv()
+        except EOFError:
+            # Child died without sending a box.
             raise ScreenException('Failed to get screen area')
+        finally:
+            proc.join()
 
         box = Box.from_tuple(box_tuple)
 
     # We may need to use some epsilon value to meet fps more tightly.
     time_per_frame = 1.0 / default_fps
     local_grab = LocalScreenGrab(box)
+    # Double buffering: while the consumer holds one frame, the next one
+    # is captured into the other buffer. Amortizes per-frame allocation
+    # to zero after warmup.
+    bufs = [np.empty(box.numpy_shape, dtype=np.uint8) for _ in range(2)]
+    current = 0
     while True:
         start = time.time()
 
-        screen = local_grab.grab()
-        target_fps = yield screen.reshape(box.numpy_shape)
+        screen = local_grab.grab(out=bufs[current])
+        current ^= 1
+        target_fps = yield screen
         if target_fps is not None:
             # Change fps accordingly
             time_per_frame = 1.0 / target_fps
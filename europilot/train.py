@@ -7,16 +7,22 @@ Utils for generating training data.
 """
 
 import os
-import re
 import time
-import hashlib
 import datetime
 import threading
 import multiprocessing
 
+import numpy as np
 from PIL import Image
 from pynput import keyboard
 
+try:
+    # libjpeg-turbo's SIMD encoder is considerably faster than PIL's
+    # jpeg path. Optional dependency; we fall back to PIL without it.
+    from turbojpeg import TurboJPEG, TJPF_RGB
+except ImportError:
+    TurboJPEG = None
+
 from europilot.compat import Queue
 from europilot.exceptions import TrainException
 from europilot.screen import stream_local_game_screen
@@ -35,10 +41,17 @@ class Config(object):
     :attr BOX: `screen.Box` object indicating capture area.
     :attr DATA_PATH: Csv file path.
     :attr IMG_PATH: Image file path.
-    :attr IMG_EXT: Image file extension.
+    :attr IMG_EXT: Image file extension. `npy` or `raw` dumps the
+    uint8 array without encoding, trading disk space for capture
+    headroom; transcode offline afterwards.
     :attr TRAIN_UID: If it's not None, file existing csv file with a name
     starts with `train_uid` and add data to that file.
     :attr DEFAULT_FPS: Default target fps for screen capture.
+    :attr NUM_WORKERS: Number of image encoder processes. If it's None,
+    a small default capped at 4 is derived from the cpu count.
+    :attr RESIZE_FACTOR: Integer downscale factor applied before images
+    are written. 1 (default) keeps capture resolution; 2 cuts encode
+    work and file size roughly 4x.
     :attr WAIT_KEYPRESS: If this is True, do not start training until start
     key (keyboard `r`, wheel `left button 1`) is pressed.
     :attr DEBUG: If this is True, write debug msg to stdout.
@@ -51,33 +64,119 @@ class Config(object):
     IMG_EXT = 'jpg'
     TRAIN_UID = None
     DEFAULT_FPS = 10
+    NUM_WORKERS = None
+    RESIZE_FACTOR = 1
     WAIT_KEYPRESS = False
     DEBUG = True
 
 
-_WORKER_BREAK_FLAG = 'stop_consuming'
+# Shutdown sentinel. None survives pickling with identity intact (an
+# object() sentinel would not), so consumers can use a pointer compare
+# instead of string equality against every payload.
+_WORKER_BREAK_FLAG = None
+
+# Capture favors encode throughput over file size: quality 85 with
+# 4:2:0 subsampling and no Huffman optimization pass. Shared by the
+# TurboJPEG and PIL encode paths.
+_JPEG_QUALITY = 85
+
+
+def _set_cpu_affinity(pid, cpus):
+    """Best-effort CPU pinning. Only supported on Linux; silently does
+    nothing elsewhere or when the kernel refuses.
+
+    :param pid: Process id, 0 for the calling process.
+    :param cpus: Iterable of cpu indexes.
+
+    """
+    try:
+        os.sched_setaffinity(pid, cpus)
+    except (AttributeError, OSError):
+        pass
+
+
+def _drop_page_cache(fd):
+    """Advises the kernel that written image bytes won't be read back,
+    so hours of capture don't evict the actual working set from the
+    page cache. Best effort; no-op where posix_fadvise is missing.
+
+    """
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except (AttributeError, OSError):
+        pass
+
+
+def _downscale(image_data, factor):
+    """Area-averaged integer downscale done as one NumPy reduction.
 
+    :param image_data: (h, w, 3) uint8 array.
+    :param factor: Integer downscale factor.
 
-def _print(text):
+    """
+    h = image_data.shape[0] // factor * factor
+    w = image_data.shape[1] // factor * factor
+    blocks = image_data[:h, :w].reshape(
+        h // factor, factor, w // factor, factor, 3)
+    return blocks.mean(axis=(1, 3)).astype(np.uint8)
+
+
+def _make_uid():
+    """Returns a short hex uid for a training run, derived from the
+    clock at microsecond resolution.
+
+    """
+    return '%08x' % (int(time.time() * 1e6) & 0xffffffff)
+
+
+def _print(fmt, *args):
+    """Debug print with lazy formatting: `args` are only interpolated
+    into `fmt` when DEBUG is on.
+
+    """
     if _global_config.DEBUG:
-        print(text)
+        print(fmt % args if args else fmt)
 
 
 class Worker(multiprocessing.Process):
 
-    def __init__(self, train_uid, inq, outq):
+    def __init__(self, train_uid, session_uid, inq, outq, frame_slots,
+                 frame_shape, free_q):
         """
         :param train_uid: This would be image filename prefix.
+        :param session_uid: Per-run uid distinguishing this session's
+        filenames from an earlier session appending to the same
+        `train_uid`.
         :param inq: inbound multiprocessing.Queue (main process <-> worker)
         :param outq: outbound multiprocessing.Queue (worker <-> writer)
+        :param frame_slots: Shared memory frame slots
+        (list of `multiprocessing.RawArray`) filled by the main process.
+        :param frame_shape: Numpy shape of a frame in a slot.
+        :param free_q: multiprocessing.Queue to which a slot index is
+        returned once its frame has been consumed.
 
         """
         multiprocessing.Process.__init__(self)
         self._train_uid = train_uid
         self._inq = inq
         self._outq = outq
+        self._frame_slots = frame_slots
+        self._frame_shape = frame_shape
+        self._free_q = free_q
         self._img_path = _global_config.IMG_PATH
         self._img_ext = _global_config.IMG_EXT
+        self._resize_factor = _global_config.RESIZE_FACTOR
+        # Monotonic per-worker counter. Combined with the session uid
+        # and worker name it yields unique filenames without per-frame
+        # datetime formatting. The session uid matters on resume: a
+        # fresh interpreter restarts both worker names and this counter,
+        # so `train_uid` alone would reproduce (and overwrite) the
+        # previous session's filenames.
+        self._img_seq = 0
+        self._filename_format = '%s_%s_%s_%%010d.%s' % (
+            self._train_uid, session_uid,
+            self.name.lower().replace('-', ''), self._img_ext
+        )
         self.daemon = True
 
     @property
@@ -85,34 +184,137 @@ class Worker(multiprocessing.Process):
         return self._train_uid
 
     def run(self):
+        # One encoder instance per worker process, not per frame.
+        self._jpeg = None
+        if TurboJPEG is not None and self._img_ext in ('jpg', 'jpeg'):
+            try:
+                self._jpeg = TurboJPEG()
+            except (RuntimeError, OSError):
+                # The python package is installed but the native
+                # libturbojpeg is not; fall back to PIL instead of
+                # killing the worker.
+                self._jpeg = None
+        # Persistent directory fd: per-frame opens then resolve only the
+        # filename instead of walking the whole image path.
+        self._dirfd = None
+        # `os.supports_dir_fd` is py3 only; skip the optimization on py2.
+        if hasattr(os, 'supports_dir_fd') and os.open in os.supports_dir_fd:
+            self._dirfd = os.open(self._img_path, os.O_RDONLY)
+        # Encoded bytes are written by a separate thread so disk I/O
+        # overlaps the next frame's encode (which releases the GIL in
+        # libjpeg). The bounded queue caps pending bytes in memory.
+        self._io_q = Queue(maxsize=4)
+        io_thread = threading.Thread(target=self.__drain_writes)
+        io_thread.daemon = True
+        io_thread.start()
+        # Numpy views over the shared slots, built once per worker.
+        frames = [
+            np.frombuffer(slot, dtype=np.uint8).reshape(self._frame_shape)
+            for slot in self._frame_slots
+        ]
+        # Rows for the writer are batched to amortize the pickle and
+        # lock cost of a queue put; the payload is tiny so latency is
+        # bounded by the time flush below.
+        batch = []
+        last_flush = time.time()
         while True:
             try:
                 # Blocking `get`
                 data = self._inq.get()
 
-                if data == _WORKER_BREAK_FLAG:
+                if data is _WORKER_BREAK_FLAG:
                     break
 
-                image_data, sensor_data = data
-                filename = self._save_image(image_data)
-                self._outq.put((filename, sensor_data))
+                slot_idx, sensor_data = data
+                filename = self._save_image(frames[slot_idx])
+                # Hand the slot back for reuse only after the frame has
+                # been consumed.
+                self._free_q.put(slot_idx)
+
+                batch.append((filename, sensor_data))
+                now = time.time()
+                if len(batch) >= 32 or now - last_flush > 0.1:
+                    self._outq.put(batch)
+                    batch = []
+                    last_flush = now
             except KeyboardInterrupt:
                 pass
 
+        if batch:
+            self._outq.put(batch)
+
+        # Drain pending writes before exiting.
+        self._io_q.put(None)
+        io_thread.join()
+
+    def __drain_writes(self):
+        while True:
+            item = self._io_q.get()
+            if item is None:
+                break
+            filename, buf = item
+            self._write_bytes(filename, buf)
+
     def _save_image(self, image_data):
         """Synchronously write image data to disk and returns filename.
         :param image_data: RGB numpy array
 
         """
-        # filename example: '{self._train_uid}_2017_07_24_21_18_46_13.jpg'
-        filename = self._train_uid + '_' + re.sub(
-            '[-:.]', '_', datetime.datetime.now().isoformat('_')[:-4]) + \
-            '.' + self._img_ext
-
-        image = Image.fromarray(image_data, 'RGB')
-        image.save(os.path.join(self._img_path, filename))
+        # filename example:
+        # '{train_uid}_{session_uid}_worker1_0000000042.jpg'
+        filename = self._filename_format % self._img_seq
+        self._img_seq += 1
+
+        if self._resize_factor > 1:
+            image_data = _downscale(image_data, self._resize_factor)
+
+        if self._img_ext == 'npy':
+            np.save(os.path.join(self._img_path, filename), image_data,
+                    allow_pickle=False)
+        elif self._img_ext == 'raw':
+            # Single contiguous write of the framebuffer; shape must be
+            # recovered from the capture box when reading back.
+            image_data.tofile(os.path.join(self._img_path, filename))
+        elif self._jpeg is not None:
+            buf = self._jpeg.encode(
+                image_data, quality=_JPEG_QUALITY, pixel_format=TJPF_RGB)
+            self._io_q.put((filename, buf))
+        else:
+            # `frombuffer` skips the array-protocol shape/stride
+            # inspection `fromarray` redoes per frame; the frame shape
+            # is fixed for the whole run.
+            image = Image.frombuffer(
+                'RGB', (image_data.shape[1], image_data.shape[0]),
+                np.ascontiguousarray(image_data), 'raw', 'RGB', 0, 1)
+            path = os.path.join(self._img_path, filename)
+            if self._img_ext in ('jpg', 'jpeg'):
+                # Explicit fast options; Pillow's `optimize` in
+                # particular costs an extra Huffman pass per frame.
+                image.save(path, format='JPEG', quality=_JPEG_QUALITY,
+                           optimize=False, progressive=False,
+                           subsampling=2)
+            else:
+                image.save(path)
         return filename
 
+    def _write_bytes(self, filename, buf):
+        """Writes encoded image bytes relative to the cached directory
+        fd when the platform supports it.
+
+        """
+        if self._dirfd is not None:
+            fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o644, dir_fd=self._dirfd)
+            try:
+                os.write(fd, buf)
+                _drop_page_cache(fd)
+            finally:
+                os.close(fd)
+        else:
+            with open(os.path.join(self._img_path, filename), 'wb') as f:
+                f.write(buf)
+                _drop_page_cache(f.fileno())
+
 
 class Writer(multiprocessing.Process):
     def __init__(self, train_uid, inq, csv_initialized=False):
@@ -123,6 +325,10 @@ class Writer(multiprocessing.Process):
         self._data_seq = 0
         self._csv_initialized = csv_initialized
         self._filename = self._train_uid + '.csv'
+        # Row format compiled once from the first row's keys; sensor
+        # values are ints, so one %-format call replaces a str() call
+        # and a join per value.
+        self._row_format = None
 
     @property
     def filename(self):
@@ -130,27 +336,32 @@ class Writer(multiprocessing.Process):
 
     def run(self):
         f = os.path.join(self._data_path, self._filename)
-        with open(f, 'a' if os.path.isfile(f) else 'w') as file_:
+        # Binary mode with a 1 MiB block buffer: short rows coalesce
+        # into large writes instead of one syscall each. Durability is
+        # handled by the fsync on shutdown below.
+        mode = 'ab' if os.path.isfile(f) else 'wb'
+        with open(f, mode, buffering=1 << 20) as file_:
             while True:
                 try:
                     data = self._inq.get()
-                    if data == _WORKER_BREAK_FLAG:
+                    if data is _WORKER_BREAK_FLAG:
                         break
-                    image_filename, sensor_data = data
-
-                    self._write(file_, image_filename, sensor_data)
-
-                    if self._data_seq % 10 == 0:
-                        _print('seq: %s, filename: %s, datetime: %s' %
-                            (
-                                self._data_seq,
-                                image_filename,
-                                str(datetime.datetime.now())
-                            )
-                        )
+
+                    # Workers send batches of rows.
+                    for image_filename, sensor_data in data:
+                        self._write(file_, image_filename, sensor_data)
+
+                        if _global_config.DEBUG and \
+                                self._data_seq % 10 == 0:
+                            _print('seq: %s, filename: %s, datetime: %s',
+                                   self._data_seq, image_filename,
+                                   datetime.datetime.now())
                 except KeyboardInterrupt:
                     pass
 
+            file_.flush()
+            os.fsync(file_.fileno())
+
     def _write(self, file_, image_filename, sensor_data):
         """Synchronously write sensor data to disk.
         :param image_filename: filename of corresponding training image
@@ -159,24 +370,29 @@ class Writer(multiprocessing.Process):
         CSV format
         seq_id,filename,sensor_data1,sensor_data2,sensor_data3,...
 
-        Order of sensor data depends on `OrderedDict` defined in
-        `controllerstate.ControllerState`.
+        Order of sensor data follows `joystick.BUTTON_NAMES`.
 
         """
-        if not self._csv_initialized:
-            # Add headers
-            sensor_header = ','.join(sensor_data.raw.keys())
-            csv_header = 'img,' + sensor_header
-            file_.write(csv_header + '\n')
-            self._csv_initialized = True
-
-        values = [image_filename] + [str(x) for x in sensor_data.raw.values()]
-        data = ','.join(values)
+        raw = sensor_data.raw
+        if self._row_format is None:
+            if not self._csv_initialized:
+                # Add headers
+                sensor_header = ','.join(raw.keys())
+                csv_header = 'img,' + sensor_header
+                file_.write((csv_header + '\n').encode('ascii'))
+                self._csv_initialized = True
+            self._row_format = '%s' + ',%d' * len(raw) + '\n'
+
         self._data_seq += 1
-        file_.write(data + '\n')
+        row = self._row_format % ((image_filename,) + tuple(raw.values()))
+        file_.write(row.encode('ascii'))
 
 
-_train_sema = threading.BoundedSemaphore(value=1)
+# Set while data generation runs; cleared by `FlowController` to pause.
+# The main loop's fast path is a single `wait()` on a set event instead
+# of the semaphore acquire/release pair per frame it used to be.
+_running_event = threading.Event()
+_running_event.set()
 _global_config = Config
 
 
@@ -199,33 +415,83 @@ def generate_training_data(config=Config):
 
         streamer = stream_local_game_screen(
             box=config.BOX, default_fps=config.DEFAULT_FPS)
+        # Start the generator before spawning workers: the first frame
+        # fixes the frame shape for the shared memory slots (and selects
+        # the capture area when `config.BOX` is None). Interrupting the
+        # interactive area selection aborts here cleanly; nothing has
+        # been started yet for the outer handler to tear down.
+        try:
+            first_image_data = next(streamer)
+        except KeyboardInterrupt:
+            return
+        frame_shape = first_image_data.shape
 
         worker_q = multiprocessing.Queue()
         writer_q = multiprocessing.Queue()
-        num_workers = multiprocessing.cpu_count()
+        num_workers = config.NUM_WORKERS
+        if num_workers is None:
+            # A few encoders saturate a single capture stream; one per
+            # core only duplicates process state and queue wakeups.
+            # Leave a core for the capture loop.
+            num_workers = max(1, min(4, multiprocessing.cpu_count() - 1))
         workers = []
 
+        # Frames are handed to workers through preallocated shared
+        # memory slots so that only a slot index and sensor data go
+        # through the queue, not a pickled copy of the image bytes.
+        # A slot index travels back through `free_q` once the worker has
+        # consumed the frame; `free_q.get` in the main loop blocks when
+        # every slot is in flight, which bounds producer memory.
+        num_slots = 2 * num_workers
+        frame_size = int(np.prod(frame_shape))
+        frame_slots = [
+            multiprocessing.RawArray('B', frame_size)
+            for _ in range(num_slots)
+        ]
+        frame_views = [
+            np.frombuffer(slot, dtype=np.uint8).reshape(frame_shape)
+            for slot in frame_slots
+        ]
+        free_q = multiprocessing.Queue()
+        for slot_idx in range(num_slots):
+            free_q.put(slot_idx)
+
         train_uid = config.TRAIN_UID
         csv_initialized = train_uid is not None
         if train_uid is None:
             # Generate train_uid to start new data generation.
-            # Call `encode` because hashlib in python3 doesn't accept unicode.
-            d = str(datetime.datetime.now()).encode('utf8')
-            train_uid = hashlib.md5(d).hexdigest()[:8]
+            train_uid = _make_uid()
+        # Always generate a fresh per-session uid for image filenames so
+        # a resumed run never collides with a previous session's files.
+        session_uid = _make_uid()
 
         for i in range(num_workers):
             workers.append(
-                Worker(train_uid, worker_q, writer_q)
+                Worker(train_uid, session_uid, worker_q, writer_q,
+                       frame_slots, frame_shape, free_q)
             )
 
         # NOTE that these workers are daemonic processes
         for worker in workers:
             worker.start()
 
-        # Start 1 process
+        # Start 1 process. The writer must start before the main process
+        # pins itself below, or it would inherit the core-0 pin and end
+        # up locked onto the capture loop's core.
         writer = Writer(train_uid, writer_q, csv_initialized)
         writer.start()
 
+        # Pin the capture loop to core 0 and spread workers over the
+        # remaining cores, so a shared frame slot stays hot in the
+        # producer's cache while it is filled and in one worker's while
+        # it is read. Skipped when there aren't enough cores to
+        # separate them.
+        num_cpus = multiprocessing.cpu_count()
+        if num_cpus > num_workers:
+            _set_cpu_affinity(0, {0})
+            for idx, worker in enumerate(workers):
+                _set_cpu_affinity(worker.pid, {1 + idx % (num_cpus - 1)})
+
         # Start 1 thread
         control_q = Queue()
         flow_controller = FlowController(control_q)
@@ -245,19 +511,13 @@ def generate_training_data(config=Config):
         last_sensor_data = None
 
         if config.WAIT_KEYPRESS:
-            if config.BOX is None:
-                # Select area and drop first screen image.
-                next(streamer)
-            _train_sema.acquire()
+            # First screen image was already dropped when the generator
+            # started above. Block until the resume key sets the event.
+            _running_event.clear()
 
         while True:
-            if flow_controller.acquired:
-                # Switch context and give flow_controller time to acquire sema.
-                time.sleep(0.1)
-
-            # TODO: Do something to resolve this in python 2.x
-            # https://bugs.python.org/issue8844
-            _train_sema.acquire()
+            # Returns immediately while running; blocks while paused.
+            _running_event.wait()
 
             if last_sensor_data is None:
                 # Start generator
@@ -268,18 +528,12 @@ def generate_training_data(config=Config):
 
             sensor_data = controller_output.get_latest_state_obj()
             last_sensor_data = sensor_data
-            worker_q.put((image_data, sensor_data))
-
-            try:
-                _train_sema.release()
-            except ValueError:
-                pass
+            slot_idx = free_q.get()
+            np.copyto(frame_views[slot_idx], image_data)
+            worker_q.put((slot_idx, sensor_data))
     except KeyboardInterrupt:
-        try:
-            _train_sema.release()
-        except ValueError:
-            # Already released.
-            pass
+        # Unblock anyone waiting on a paused run.
+        _running_event.set()
 
         control_q.put(_WORKER_BREAK_FLAG)
         controller_output.terminate()
@@ -287,16 +541,25 @@ def generate_training_data(config=Config):
         # Gracefully stop workers
         for _ in range(num_workers):
             worker_q.put(_WORKER_BREAK_FLAG)
-        writer_q.put(_WORKER_BREAK_FLAG)
 
+        # Let each worker flush its final row batch and drain its
+        # pending image writes before exiting; terminating right away
+        # would leave csv rows referencing images that never hit disk.
+        # Terminate only workers that fail to finish in time.
         for worker in workers:
-            worker.terminate()
-
+            worker.join(timeout=5)
         for worker in workers:
-            worker.join()
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
 
-        writer.terminate()
-        writer.join()
+        # The writer sentinel goes in only after the workers are done,
+        # so their final batches are queued ahead of it.
+        writer_q.put(_WORKER_BREAK_FLAG)
+        writer.join(timeout=5)
+        if writer.is_alive():
+            writer.terminate()
+            writer.join()
 
 
 def _feed_control_signal(q, key_value=None, sensor_data=None):
@@ -358,11 +621,6 @@ class FlowController(threading.Thread):
         threading.Thread.__init__(self)
         self.daemon = True
         self._inq = inq
-        self._acquired = False
-
-    @property
-    def acquired(self):
-        return self._acquired
 
     def run(self):
         while True:
@@ -371,22 +629,16 @@ class FlowController(threading.Thread):
                 self._resume_data_generation()
             elif signal == self.PAUSE_SIGNAL:
                 self._pause_data_generation()
-            elif signal == _WORKER_BREAK_FLAG:
+            elif signal is _WORKER_BREAK_FLAG:
                 break
 
     def _pause_data_generation(self):
         _print('Data generation paused')
-        if not self._acquired:
-            self._acquired = True
-            _train_sema.acquire()
+        _running_event.clear()
 
     def _resume_data_generation(self):
         _print('Data generation resumed')
-        try:
-            _train_sema.release()
-            self._acquired = False
-        except ValueError:
-            pass
+        _running_event.set()
 
 
 class FpsAdjuster(object):
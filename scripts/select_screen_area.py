@@ -1,5 +1,8 @@
-"""Select screen area with opencv and write output to stdout.
-This script will be executed from `europilot.screen.stream_local_game_screen`.
+"""Select screen area with opencv and write the box tuple to stdout.
+
+Standalone helper; `europilot.screen.stream_local_game_screen` now runs
+the selection in process via `multiprocessing` and no longer executes
+this script.
 
 """
 import os
@@ -1,12 +1,13 @@
-import time
-
-from europilot.screen import stream_local_game_screen, Box
+from europilot.screen import AsyncLocalScreenGrab, Box
 
 box = Box(0, 0, 500, 500)
-streamer = stream_local_game_screen(box=box)
+
+# The grabber captures in a background thread; `next_frame` blocks just
+# until a fresh frame arrives, so this loop runs once per capture
+# instead of sleeping a fixed interval.
+grabber = AsyncLocalScreenGrab(box)
+grabber.prepare()
 while True:
-    arr = next(streamer)
+    arr = grabber.next_frame()
     print((type(arr), arr.shape))
     # Do something with arr
-    time.sleep(0.5)
-
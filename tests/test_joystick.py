@@ -0,0 +1,56 @@
+"""Tests for joystick message parsing
+
+"""
+
+import struct
+
+from europilot.joystick import Message
+
+
+def make_event(value, group, axis, sequence=0):
+    return struct.pack('<IHBB', sequence, value, group, axis)
+
+
+class TestMessage(object):
+    def test_wheel_axis(self):
+        # Wheel values are normalized to [-32767, 32767].
+        message = Message(make_event(32769, 0x02, 0x00))
+        assert message.name == 'wheel-axis'
+        assert message.value == -32767
+
+        message = Message(make_event(32767, 0x02, 0x00))
+        assert message.value == 32767
+
+    def test_wheel_axis_full_range(self):
+        # The branchless sign fix must match the documented mapping over
+        # the whole range. 0x8000 is excluded: the wheel never emits it.
+        for raw in range(65536):
+            if raw == 32768:
+                continue
+            expected = raw - 65536 if raw >= 32769 else raw
+            message = Message(make_event(raw, 0x02, 0x00))
+            assert message.value == expected
+
+    def test_pedal(self):
+        # Pedal values are normalized to [0, 65535].
+        # No pressure: 0x7fff, full: 0x8001
+        message = Message(make_event(32767, 0x02, 0x01))
+        assert message.name == 'clutch'
+        assert message.value == 0
+
+        message = Message(make_event(32769, 0x02, 0x01))
+        assert message.value == 65535
+
+    def test_dpad(self):
+        # Arrow pad values are normalized to [-1, 1].
+        message = Message(make_event(32769, 0x02, 0x04))
+        assert message.name == 'dpad-left/right'
+        assert message.value == -1
+
+        message = Message(make_event(32767, 0x02, 0x04))
+        assert message.value == 1
+
+    def test_button(self):
+        message = Message(make_event(1, 0x01, 0x07))
+        assert message.name == 'wheel-button-left-1'
+        assert message.value == 1
@@ -16,6 +16,11 @@ class TestScreenGrab(object):
     def test_local_mss_grab_image_size(self):
         screen_grab = LocalScreenGrab(self._box)
         rgb_arr = screen_grab.grab()
+        assert rgb_arr.shape == self._box.numpy_shape
+
+    def test_local_mss_grab_flat_image_size(self):
+        screen_grab = LocalScreenGrab(self._box)
+        rgb_arr = screen_grab.grab_flat()
         assert len(rgb_arr) == self._box.width * self._box.height * 3
 
     def test_local_mss_performance(self):